@@ -10,10 +10,44 @@ import google.generativeai as genai
 from sklearn.metrics import precision_score, recall_score, f1_score
 import time
 import ast
+import faiss
+import numpy as np
+from functools import lru_cache
+from langchain_core.embeddings import Embeddings
 
 # Load environment variables
 load_dotenv()
 
+# Number of distinct questions whose embeddings are kept in memory
+QUERY_EMBEDDING_CACHE_SIZE = 2048
+
+# Minimum cosine similarity for a question to reuse a previous answer
+SEMANTIC_CACHE_THRESHOLD = 0.97
+
+# Number of past answers kept for reuse; the oldest are evicted first
+SEMANTIC_CACHE_MAX_ENTRIES = 256
+
+# Prefix GeminiClient puts on the answer text when generation fails. Only
+# used when the pipeline response carries no explicit "error" field, and
+# must be kept in sync with utils/gemini_client.py
+GEMINI_ERROR_PREFIX = "Error"
+
+class QueryCachedEmbeddings(Embeddings):
+    """Wrap an embedding model so repeated questions are embedded only once"""
+
+    def __init__(self, embeddings, maxsize=QUERY_EMBEDDING_CACHE_SIZE):
+        self.embeddings = embeddings
+        self._cached_embed_query = lru_cache(maxsize=maxsize)(self._embed_query)
+
+    def _embed_query(self, text):
+        return tuple(self.embeddings.embed_query(text))
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        return list(self._cached_embed_query(text))
+
 # Page configuration
 st.set_page_config(
     page_title="Lib-Pal Chatbot",
@@ -31,6 +65,10 @@ if "rag_pipeline" not in st.session_state:
     st.session_state.rag_pipeline = None
 if "documents_processed" not in st.session_state:
     st.session_state.documents_processed = False
+if "answer_cache_index" not in st.session_state:
+    st.session_state.answer_cache_index = None
+if "answer_cache" not in st.session_state:
+    st.session_state.answer_cache = []
 
 # Initialize components
 @st.cache_resource
@@ -40,19 +78,71 @@ def initialize_components():
     vector_store_manager = VectorStoreManager()
     return doc_processor, vector_store_manager
 
+@st.cache_resource
+def create_gemini_client(api_key):
+    """Create and cache one Gemini client per API key, shared across reruns"""
+    # GeminiClient reads the key from the environment; api_key is only the
+    # cache key, so a rotated key gets a fresh client
+    return GeminiClient()
+
 def get_gemini_client():
     """Get Gemini client, initializing only when API key is available"""
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key or api_key == "your_gemini_api_key_here":
         return None
     try:
-        return GeminiClient()
+        return create_gemini_client(api_key)
     except Exception as e:
         st.error(f"Failed to initialize Gemini client: {str(e)}")
         return None
 
 doc_processor, vector_store_manager = initialize_components()
 
+def reset_answer_cache():
+    """Forget cached answers, e.g. when the knowledge base changes"""
+    st.session_state.answer_cache_index = None
+    st.session_state.answer_cache = []
+
+def embed_question(question):
+    """Embed a question as a normalized row vector for the answer cache"""
+    # QueryCachedEmbeddings memoizes this, so retrieval reuses the same pass
+    embedding = st.session_state.vector_store.embedding_function.embed_query(question)
+    query_vector = np.array([embedding], dtype="float32")
+    faiss.normalize_L2(query_vector)
+    return query_vector
+
+def lookup_cached_answer(query_vector):
+    """Return a previous response for a near-identical question, if any"""
+    cache_index = st.session_state.answer_cache_index
+    if cache_index is None or cache_index.ntotal == 0:
+        return None
+    scores, ids = cache_index.search(query_vector, 1)
+    if scores[0][0] >= SEMANTIC_CACHE_THRESHOLD:
+        return st.session_state.answer_cache[ids[0][0]]
+    return None
+
+def is_cacheable_response(response):
+    """Only successful, source-backed answers are worth replaying"""
+    if not response.get("sources"):
+        return False
+    if "error" in response:
+        return not response["error"]
+    return not response["answer"].lstrip().startswith(GEMINI_ERROR_PREFIX)
+
+def store_cached_answer(query_vector, response):
+    """Remember a response so similar questions can skip the pipeline"""
+    if st.session_state.answer_cache_index is None:
+        st.session_state.answer_cache_index = faiss.IndexFlatIP(query_vector.shape[1])
+    cache_index = st.session_state.answer_cache_index
+    # Evict the oldest entries; a flat index renumbers the remaining rows
+    # from 0, keeping them aligned with positions in answer_cache
+    overflow = cache_index.ntotal - SEMANTIC_CACHE_MAX_ENTRIES + 1
+    if overflow > 0:
+        cache_index.remove_ids(np.arange(overflow, dtype="int64"))
+        del st.session_state.answer_cache[:overflow]
+    cache_index.add(query_vector)
+    st.session_state.answer_cache.append(response)
+
 def process_uploaded_files(uploaded_files):
     """Process uploaded files and update vector store"""
     # Check if Gemini client can be initialized
@@ -74,7 +164,10 @@ def process_uploaded_files(uploaded_files):
         if all_chunks:
             # Create or update vector store
             vector_store = vector_store_manager.create_vector_store(all_chunks)
+            # Share one query embedding cache between retrieval and the app
+            vector_store.embedding_function = QueryCachedEmbeddings(vector_store.embedding_function)
             st.session_state.vector_store = vector_store
+            reset_answer_cache()
             
             # Initialize RAG pipeline
             st.session_state.rag_pipeline = RAGPipeline(
@@ -153,7 +246,12 @@ def main():
                 with st.spinner("Thinking..."):
                     try:
                         start = time.time()
-                        response = st.session_state.rag_pipeline.query(prompt)
+                        query_vector = embed_question(prompt)
+                        response = lookup_cached_answer(query_vector)
+                        if response is None:
+                            response = st.session_state.rag_pipeline.query(prompt)
+                            if is_cacheable_response(response):
+                                store_cached_answer(query_vector, response)
                         end = time.time()
                         st.markdown(response["answer"])
                         assistant_message = {
@@ -197,6 +295,7 @@ def main():
             st.session_state.vector_store = None
             st.session_state.rag_pipeline = None
             st.session_state.documents_processed = False
+            reset_answer_cache()
             st.rerun()
             
             